@@ -1,9 +1,22 @@
 import zmq
 import time
+import math
+import struct
+from dataclasses import dataclass
+from zmq_common import endpoint, signal_ready
 
 # --- CONFIGURATION ---
 READY_TIME = 3.0
 REST_TIME = 2.0
+# Timers run on the monotonic clock in integer nanoseconds
+READY_NS = int(READY_TIME * 1e9)
+REST_NS = int(REST_TIME * 1e9)
+
+# Signals in (connect), LED flags and slide commands out (bind)
+BLINK_EP = endpoint("SIGMA_BLINK_EP", "ipc:///tmp/4sigma_blink.sock", "tcp://127.0.0.1:5555")
+MOVE_EP = endpoint("SIGMA_MOVE_EP", "ipc:///tmp/4sigma_move.sock", "tcp://127.0.0.1:5556")
+LED_EP = endpoint("SIGMA_LED_EP", "ipc:///tmp/4sigma_led.sock", "tcp://*:5557")
+SLIDE_EP = endpoint("SIGMA_SLIDE_EP", "ipc:///tmp/4sigma_slide.sock", "tcp://*:5558")
 
 # Communication Flags
 FLAGS = {
@@ -20,122 +33,153 @@ STATES = {
     "RESTING": 3
 }
 
+# --- STATE HANDLERS ---
+# Each handler gets the shared context and returns the next state.
+@dataclass
+class CoreContext:
+    led_pub: zmq.Socket
+    slide_pub: zmq.Socket
+    wait_start_time: int = 0
+    move_armed: bool = False
+    led_flag: int = FLAGS["BLINK_WAIT"]
+    # Signals received in the current iteration (None = nothing arrived)
+    blink_signal: int | None = None
+    move_signal: int | None = None
+
+# --- STATE 0: WAIT FOR BLINK (Trigger) ---
+def handle_wait_for_blink(ctx):
+    if ctx.blink_signal == 1:
+        print(">>> TRIGGER: Blink Detected!")
+        ctx.wait_start_time = time.monotonic_ns()
+        # Original code logic: transition to PREPARE, LED update happens there
+        return STATES["PREPARE_TO_LISTEN"]
+    return STATES["WAIT_FOR_BLINK"]
+
+# --- STATE 1: PREPARATION (Debounce/Ready) ---
+def handle_prepare_to_listen(ctx):
+    current_wait_time = time.monotonic_ns() - ctx.wait_start_time
+    if current_wait_time >= READY_NS:
+        print(">>> SYSTEM READY: Listening for moves.")
+        
+        # Set LED to Green
+        ctx.led_flag = FLAGS["READY"]
+        ctx.led_pub.send(struct.pack("b", ctx.led_flag))
+        
+        # Enable move detection logic
+        ctx.move_armed = True
+        return STATES["WAIT_FOR_MOVE"]
+    return STATES["PREPARE_TO_LISTEN"]
+
+# --- STATE 2: LISTEN FOR MOVE (Action) ---
+def handle_wait_for_move(ctx):
+    move_signal = ctx.move_signal
+    # React only if system is "armed"; anything else is flushed (safety)
+    if ctx.move_armed and (move_signal == 1 or move_signal == -1):
+        ctx.slide_pub.send(struct.pack("b", move_signal))
+        
+        ctx.wait_start_time = time.monotonic_ns()
+        print(f">>> MOVE EXECUTED: {move_signal}")
+        
+        # Reset for future
+        ctx.move_armed = False
+        
+        # Set LED to Orange (Rest)
+        ctx.led_flag = FLAGS["REST"]
+        ctx.led_pub.send(struct.pack("b", ctx.led_flag))
+        return STATES["RESTING"]
+    return STATES["WAIT_FOR_MOVE"]
+
+# --- STATE 3: REST (Cooldown) ---
+def handle_resting(ctx):
+    current_wait_time = time.monotonic_ns() - ctx.wait_start_time
+    if current_wait_time >= REST_NS:
+        # Back to Red LED
+        ctx.led_flag = FLAGS["BLINK_WAIT"]
+        ctx.led_pub.send(struct.pack("b", ctx.led_flag))
+        
+        print(">>> BACK TO BLINK WATCH")
+        return STATES["WAIT_FOR_BLINK"]
+    return STATES["RESTING"]
+
+# Indexed by state number
+HANDLERS = (handle_wait_for_blink, handle_prepare_to_listen, handle_wait_for_move, handle_resting)
+# Timer length per state (ns), None = no timer (wait for signals only)
+STATE_TIMERS = (None, READY_NS, None, REST_NS)
+
 def run_core_unit():
     # Defining sockets
-    context = zmq.Context()
+    # One IO thread is plenty for a few small control messages per second
+    context = zmq.Context.instance(io_threads=1)
     print("Core Unit: Initializing...")
 
-    # --- 1. SIGNAL RECEPTION (Subscribers) ---
     blink_sub = context.socket(zmq.SUB)
-    blink_sub.connect("tcp://localhost:5555")
-    blink_sub.setsockopt_string(zmq.SUBSCRIBE, "")
-
     move_sub = context.socket(zmq.SUB)
-    move_sub.connect("tcp://localhost:5556")
-    move_sub.setsockopt_string(zmq.SUBSCRIBE, "")
-
-    # --- 2. STATE BROADCASTING (Publishers) ---
     led_pub = context.socket(zmq.PUB)
-    led_pub.bind("tcp://*:5557")
-
     slide_pub = context.socket(zmq.PUB)
-    slide_pub.bind("tcp://*:5558")
+
+    # Options first, connect/bind below. Drop unsent messages on close; detect dead peers on the TCP links
+    for sock in (blink_sub, move_sub, led_pub, slide_pub):
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    led_pub.setsockopt(zmq.SNDHWM, 100)
+    slide_pub.setsockopt(zmq.SNDHWM, 100)
 
     # Keep only the last message to avoid processing history
     blink_sub.setsockopt(zmq.CONFLATE, 1)
     move_sub.setsockopt(zmq.CONFLATE, 1)
 
+    # --- 1. SIGNAL RECEPTION (Subscribers) ---
+    # The signal byte doubles as the topic: subscribe only to the values that drive the
+    # state machine, so libzmq drops the idle 0 messages before Python sees them
+    # (and a trailing 0 can no longer overwrite an unread blink/move in the conflated queue)
+    blink_sub.connect(BLINK_EP)
+    blink_sub.setsockopt(zmq.SUBSCRIBE, struct.pack("b", 1))
+
+    move_sub.connect(MOVE_EP)
+    move_sub.setsockopt(zmq.SUBSCRIBE, struct.pack("b", 1))
+    move_sub.setsockopt(zmq.SUBSCRIBE, struct.pack("b", -1))
+
+    # --- 2. STATE BROADCASTING (Publishers) ---
+    led_pub.bind(LED_EP)
+    slide_pub.bind(SLIDE_EP)
+    signal_ready("CORE")
+
+    # Block in the kernel until a signal arrives (or a timer expires) instead of spinning
+    poller = zmq.Poller()
+    poller.register(blink_sub, zmq.POLLIN)
+    poller.register(move_sub, zmq.POLLIN)
+
     print("Core Unit: Waiting for signals...")
 
-    wait_start_time = 0.0
     state = STATES["WAIT_FOR_BLINK"]
-    led_flag = FLAGS["BLINK_WAIT"]
+    ctx = CoreContext(led_pub=led_pub, slide_pub=slide_pub)
 
     # Initial LED update
     time.sleep(0.5)
-    led_pub.send_json({"flag": led_flag})
-    
-    # Logic variables
-    move_armed = False 
+    led_pub.send(struct.pack("b", ctx.led_flag))
     
     try:
         while True:
-            time.sleep(0.01) # CPU Saver
+            # Timeout = time left until the active timer (READY/REST) expires, infinite otherwise
+            timer_ns = STATE_TIMERS[state]
+            if timer_ns is None:
+                timeout_ms = -1
+            else:
+                remaining = ctx.wait_start_time + timer_ns - time.monotonic_ns()
+                timeout_ms = math.ceil(max(0, remaining) / 1_000_000)
+
+            socks = dict(poller.poll(timeout_ms))
+
+            # Always consume ready sockets; signals not expected in the current state are dropped
+            # Blink (0 / 1) and move (-1 / 0 / 1) signals arrive as one signed byte each
+            ctx.blink_signal = struct.unpack("b", blink_sub.recv())[0] if blink_sub in socks else None
+            ctx.move_signal = struct.unpack("b", move_sub.recv())[0] if move_sub in socks else None
 
             # State Machine
-            match state:
-                # --- STATE 0: WAIT FOR BLINK (Trigger) ---
-                case 0: # WAIT_FOR_BLINK
-                    try:
-                        # Non-blocking receive
-                        msg = blink_sub.recv_json(flags=zmq.NOBLOCK)
-                        if msg.get("blink") == 1:
-                            print(">>> TRIGGER: Blink Detected!")
-                            state = STATES["PREPARE_TO_LISTEN"]
-                            wait_start_time = time.time()
-                            
-                            # Original code logic: transition to PREPARE, LED update happens there
-                    except zmq.Again:
-                        pass
-
-                # --- STATE 1: PREPARATION (Debounce/Ready) ---
-                case 1: # PREPARE_TO_LISTEN
-                    current_wait_time = time.time() - wait_start_time
-                    if current_wait_time >= READY_TIME:
-                        print(">>> SYSTEM READY: Listening for moves.")
-                        state = STATES["WAIT_FOR_MOVE"]
-                        
-                        # Set LED to Green
-                        led_flag = FLAGS["READY"]
-                        led_pub.send_json({"flag": led_flag})
-                        
-                        # Enable move detection logic
-                        move_armed = True
-
-                # --- STATE 2: LISTEN FOR MOVE (Action) ---
-                case 2: # WAIT_FOR_MOVE
-                    try:
-                        msg = move_sub.recv_json(flags=zmq.NOBLOCK)
-                        move_signal = msg.get("move", 0)
-
-                        if not move_armed:
-                            # Flush old messages if not armed (safety)
-                            pass
-                        else:
-                            # React only if system is "armed"
-                            if move_signal == 1 or move_signal == -1:
-                                slide_msg = {"move": move_signal}
-                                slide_pub.send_json(slide_msg)
-                                
-                                state = STATES["RESTING"]
-                                wait_start_time = time.time()
-                                print(f">>> MOVE EXECUTED: {move_signal}")
-                                
-                                # Reset for future
-                                move_armed = False
-                                
-                                # Set LED to Orange (Rest)
-                                led_flag = FLAGS["REST"]
-                                led_pub.send_json({"flag": led_flag})
-
-                    except zmq.Again:
-                        pass
-
-                # --- STATE 3: REST (Cooldown) ---
-                case 3: # RESTING
-                    current_wait_time = time.time() - wait_start_time
-                    if current_wait_time >= REST_TIME:
-                        # Back to Red LED
-                        led_flag = FLAGS["BLINK_WAIT"]
-                        led_pub.send_json({"flag": led_flag})
-                        
-                        state = STATES["WAIT_FOR_BLINK"]
-                        print(">>> BACK TO BLINK WATCH")
+            state = HANDLERS[state](ctx)
 
     except KeyboardInterrupt:
         print("Core Unit shutting down.")
-    finally:
-        context.term()
 
 if __name__ == '__main__':
     run_core_unit()
@@ -1,35 +1,51 @@
 import numpy as np
+import os
 import time
 import sys
 import zmq
-from scipy.signal import butter, sosfilt, iirnotch, lfilter, welch
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import matplotlib
+import json
+import struct
+import threading
+import argparse
+import signal
+from scipy.signal import butter, sosfilt, iirnotch, tf2sos, get_window
 from collections import deque
+from zmq_common import endpoint, signal_ready
 
 # --- BRAINACCESS IMPORTS ---
 from brainaccess.utils import acquisition
 from brainaccess.core.eeg_manager import EEGManager
 
 # --- 0. CONFIGURATION ---
-matplotlib.use("QtAgg", force=True)
-
 DEVICE_NAME = "BA HALO 057"
 SFREQ = 250
 KANALY_DO_ANALIZY = ['Fp1', 'Fp2'] 
 
 # --- ZMQ CONFIGURATION (BROADCASTING) ---
-ZMQ_PORT_DATA = 6000      # Here we broadcast raw data (Relay)
-ZMQ_PORT_DECISION = 5556  # Here we broadcast decisions (Core Unit)
+ZMQ_EP_DATA = endpoint("SIGMA_RELAY_EP", "ipc:///tmp/4sigma_relay.sock", "tcp://*:6000")     # Here we broadcast raw data (Relay)
+ZMQ_EP_DECISION = endpoint("SIGMA_MOVE_EP", "ipc:///tmp/4sigma_move.sock", "tcp://*:5556")   # Here we broadcast decisions (Core Unit)
+
+# CPU pinning (Linux only, None = leave it to the scheduler)
+DSP_CPU = None     # Core for this process (acquisition, filtering, detection)
+ZMQ_IO_CPU = None  # Core for the ZMQ IO thread
 
 # Relay Config
 ALL_CHANNELS_OUT = ["Fp1", "Fp2", "O1", "O2"]
 HALO_CHANNELS_MAP = {0: "Fp1", 1: "Fp2", 2: "O1", 3: "O2"}
+# Hardware rows that make up the relay payload, in ALL_CHANNELS_OUT order
+CH_ROW_BY_NAME = {v: k for k, v in HALO_CHANNELS_MAP.items()}
+RELAY_CH_IDX = np.array([CH_ROW_BY_NAME[ch] for ch in ALL_CHANNELS_OUT], dtype=np.intp)
+# Frame 0 of every relay message; frames 1..N are raw (channels x samples) float32 chunks in uV
+RELAY_BATCH = 2 # Detection frames per relay message (1 = send every frame, no added latency)
+RELAY_HEADER = json.dumps({"channels": ALL_CHANNELS_OUT, "sfreq": SFREQ, "dtype": "float32"}).encode()
 
 # Time windows
 CZAS_OKNA_ANALIZY = 4.0      
 OKNO_FFT = 0.5              
+ANALYSIS_INTERVAL = 0.05     # Detection frame period (MIN_LICZBA_KLATEK counts these frames)
+PLOT_INTERVAL_MS = 100       # Redraw period of the plot window
+YLIM_UPDATE_EVERY = 10       # Redraws between y-axis rescales (rescaling forces a full redraw)
+YLIM_TOLERANCE = 0.1         # Rescale only when a limit moves by more than this fraction
 
 # Detection (Teeth vs Head)
 CZAS_KALIBRACJI = 3.0        
@@ -41,25 +57,42 @@ COOLDOWN_PO_WYKRYCIU = 1.0
 MIN_LICZBA_KLATEK = 2
 
 # --- GLOBAL VARIABLES ---
-N_CH_INPUT = len(KANALY_DO_ANALIZY)
-N_PLOTS = 2
 BUFFER_SIZE = int(SFREQ * CZAS_OKNA_ANALIZY)
 FFT_WINDOW_SIZE = int(SFREQ * OKNO_FFT)
+# Timers run on the monotonic clock in integer nanoseconds
+CZAS_KALIBRACJI_NS = int(CZAS_KALIBRACJI * 1e9)
+COOLDOWN_PO_WYKRYCIU_NS = int(COOLDOWN_PO_WYKRYCIU * 1e9)
 
 # Hardware initialization
 eeg = acquisition.EEG()
 
-# Buffers
-eeg_buffer = np.zeros((N_CH_INPUT, BUFFER_SIZE))
-power_buffer = np.zeros(BUFFER_SIZE)
-times_buffer = np.linspace(-CZAS_OKNA_ANALIZY, 0, BUFFER_SIZE)
+# Buffers (float32 end-to-end; only the IIR filter state stays float64, see PROCESSING)
+DTYPE = np.float32
+filtered_buffer = np.zeros(BUFFER_SIZE, dtype=DTYPE)
+power_buffer = np.zeros(BUFFER_SIZE, dtype=DTYPE) # Ring buffer, oldest sample at power_write_idx
+power_write_idx = 0
+# power_buffer[RING_IDX[i:i + BUFFER_SIZE]] is the ring unrolled oldest-first starting at slot i
+RING_IDX = np.arange(2 * BUFFER_SIZE, dtype=np.intp) % BUFFER_SIZE
+times_buffer = np.linspace(-CZAS_OKNA_ANALIZY, 0, BUFFER_SIZE, dtype=DTYPE)
+# Snapshots drawn by the GUI thread (filtered_buffer/power_buffer are written by the worker)
+plot_signal = np.zeros(BUFFER_SIZE, dtype=DTYPE)
+plot_power = np.zeros(BUFFER_SIZE, dtype=DTYPE)
+buffer_lock = threading.Lock()
+# Scratch buffers reused every frame instead of allocating temporaries
+scratch_avg = np.empty(BUFFER_SIZE, dtype=DTYPE)
+# One float32 relay slot per batched chunk, up to 1 s of samples (bigger chunks get a fresh array)
+relay_scratch = np.empty((RELAY_BATCH, len(ALL_CHANNELS_OUT) * SFREQ), dtype=np.float32)
+stop_event = threading.Event()
 
 processed_samples = 0
 ch_indices = [k for k, v in HALO_CHANNELS_MAP.items() if v in KANALY_DO_ANALIZY]
+CH_IDX = np.array(ch_indices, dtype=np.intp) # Row gather for the analysis channels
 
 # State
 counter_zacisk = 0
-block_until = 0.0
+block_until = 0
+last_sent_signal = 0
+relay_pending = [] # Relay chunks waiting for the next batched send
 is_calibrated = False
 calibration_buffer = [] 
 baseline_power = 1.0    
@@ -67,110 +100,177 @@ baseline_power = 1.0
 # Filters
 b_notch, a_notch = iirnotch(50.0, 30.0, fs=SFREQ) 
 sos_high = butter(2, 2.0, btype='highpass', fs=SFREQ, output='sos')
+# Notch + highpass as one SOS cascade, applied to new samples only (state kept between frames)
+sos_all = np.vstack([tf2sos(b_notch, a_notch), sos_high])
+zi_all = np.zeros((sos_all.shape[0], 2))
+
+# Spectrum (fixed window length -> everything but the samples is computed once)
+# Band power is the mean PSD over the FREQ_MIN..FREQ_MAX bins of a mean-detrended, Hann-windowed
+# segment (a single-segment welch()). Detrend, window, DFT and PSD scaling fold into one real
+# matrix, so per frame it is one matrix-vector product: power = ||BAND_PROJECTION @ segment||^2
+FFT_WINDOW = get_window('hann', FFT_WINDOW_SIZE)
+FFT_SCALE = 2.0 / (SFREQ * np.sum(FFT_WINDOW ** 2)) # One-sided PSD density, same as welch()
+FFT_FREQS = np.fft.rfftfreq(FFT_WINDOW_SIZE, d=1.0 / SFREQ)
+BAND_FREQS = FFT_FREQS[(FFT_FREQS >= FREQ_MIN) & (FFT_FREQS <= FREQ_MAX)]
+band_phase = 2 * np.pi * np.outer(BAND_FREQS, np.arange(FFT_WINDOW_SIZE)) / SFREQ
+BAND_PROJECTION = np.vstack([np.cos(band_phase), np.sin(band_phase)]) * FFT_WINDOW
+BAND_PROJECTION *= np.sqrt(FFT_SCALE / max(BAND_FREQS.size, 1))
+BAND_PROJECTION -= BAND_PROJECTION.mean(axis=1, keepdims=True) # Mean detrend
+BAND_PROJECTION = BAND_PROJECTION.astype(DTYPE)
 
 # --- ZMQ SETUP ---
-context = zmq.Context()
-
-# Socket 1: RELAY (Data)
-socket_data = context.socket(zmq.PUB)
-socket_data.bind(f"tcp://*:{ZMQ_PORT_DATA}")
-
-# Socket 2: DECISIONS (Core)
-socket_decision = context.socket(zmq.PUB)
-socket_decision.bind(f"tcp://*:{ZMQ_PORT_DECISION}")
-
-print(f">>>START")
-print(f"    - Relay (Data):      Port {ZMQ_PORT_DATA}")
-print(f"    - Decisions:         Port {ZMQ_PORT_DECISION}")
-
-# --- 1. PLOT INITIALIZATION ---
-fig, ax = plt.subplots(N_PLOTS, 1, sharex=True, figsize=(10, 8))
-fig.suptitle(f"TEETH vs HEAD + RELAY")
-
-lines = []
-# Signal plot
-ax[0].set_ylabel("Signal (uV)", fontsize=9)
-line0, = ax[0].plot(times_buffer, np.zeros(BUFFER_SIZE), lw=1, color='tab:blue')
-lines.append(line0)
-ax[0].grid(True, alpha=0.5)
-
-# Power plot
-ax[1].set_ylabel("Power (Ratio)", fontsize=9)
-line1, = ax[1].plot(times_buffer, np.zeros(BUFFER_SIZE), lw=2, color='tab:red')
-lines.append(line1)
-
-# Threshold lines
-line_thresh_teeth = ax[1].axhline(y=MNOZNIK_DOLNY_Zeby, color='g', linestyle='--', label='Teeth')
-line_thresh_head = ax[1].axhline(y=MNOZNIK_GORNY_Glowa, color='m', linestyle='--', label='Head')
-ax[1].legend(loc='upper left')
-ax[1].grid(True, alpha=0.5)
-ax[1].set_yscale('log')
-ax[-1].set_xlabel("Time (s)")
+# Created by run() in the process that uses them: importing this module (e.g. in the loader)
+# must not bind the endpoints or pin the importing process
+socket_data = None
+socket_decision = None
+
+def setup_zmq():
+    global socket_data, socket_decision
+
+    # Only cores this process may run on are used (libzmq aborts on an invalid one)
+    allowed_cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set()
+    if ZMQ_IO_CPU in allowed_cpus:
+        zmq.Context.instance(io_threads=1).set(zmq.THREAD_AFFINITY_CPU_ADD, ZMQ_IO_CPU) # Before the first socket starts the IO thread
+    if DSP_CPU in allowed_cpus:
+        os.sched_setaffinity(0, {DSP_CPU}) # Threads started later (acquisition, plot worker) inherit it
+    context = zmq.Context.instance(io_threads=1) # ~4 kB/s of EEG, far below one IO thread's capacity
+
+    # Socket 1: RELAY (Data)
+    socket_data = context.socket(zmq.PUB)
+    socket_data.setsockopt(zmq.SNDHWM, 10) # Drop frames rather than queue seconds of EEG for a stalled client
+    socket_data.setsockopt(zmq.SNDBUF, 1 << 20) # 1 MB kernel buffer so a laggy loopback does not backpressure
+    socket_data.setsockopt(zmq.IMMEDIATE, 1) # Only queue to completed connections
+
+    # Socket 2: DECISIONS (Core)
+    socket_decision = context.socket(zmq.PUB)
+    socket_decision.setsockopt(zmq.SNDHWM, 1) # At most one decision in flight; the core subscriber conflates too
+
+    # Common options, still before bind
+    for sock in (socket_data, socket_decision):
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    socket_data.bind(ZMQ_EP_DATA)
+    socket_decision.bind(ZMQ_EP_DECISION)
+
+    print(f">>>START")
+    print(f"    - Relay (Data):      {ZMQ_EP_DATA}")
+    print(f"    - Decisions:         {ZMQ_EP_DECISION}")
+
+# --- 1. PLOT INITIALIZATION (only with --plot) ---
+app, win, plots, curves = None, None, [], []
+plot_frame = 0
+ylim_signal, ylim_power = 10.0 * 1.1, MNOZNIK_GORNY_Glowa * 1.5 # Current upper y limits
+
+def init_plot():
+    # pyqtgraph/Qt are imported here, so headless runs never load them
+    global app, win
+    import pyqtgraph as pg
+
+    app = pg.mkQApp("Move detector")
+    win = pg.GraphicsLayoutWidget(title="TEETH vs HEAD + RELAY")
+    win.resize(1000, 800)
+
+    # Signal plot
+    p0 = win.addPlot(row=0, col=0)
+    p0.setLabel('left', "Signal (uV)")
+    p0.showGrid(x=True, y=True, alpha=0.5)
+    curves.append(p0.plot(times_buffer, plot_signal, pen=pg.mkPen('c', width=1)))
+
+    # Power plot (log y: ranges and line positions are given in log10)
+    p1 = win.addPlot(row=1, col=0)
+    p1.setLabel('left', "Power (Ratio)")
+    p1.setLabel('bottom', "Time (s)")
+    p1.showGrid(x=True, y=True, alpha=0.5)
+    p1.setLogMode(y=True)
+    p1.setXLink(p0)
+    curves.append(p1.plot(times_buffer, plot_power, pen=pg.mkPen('r', width=2)))
+
+    # Threshold lines
+    p1.addLegend(offset=(10, 10))
+    p1.plot([-CZAS_OKNA_ANALIZY, 0], [MNOZNIK_DOLNY_Zeby] * 2, pen=pg.mkPen('g', width=2, style=pg.QtCore.Qt.DashLine), name='Teeth')
+    p1.plot([-CZAS_OKNA_ANALIZY, 0], [MNOZNIK_GORNY_Glowa] * 2, pen=pg.mkPen('m', width=2, style=pg.QtCore.Qt.DashLine), name='Head')
+    plots.extend([p0, p1])
+
+    # Static x axis (x data never changes) and starting y ranges; no autorange per frame
+    for plot in plots: plot.disableAutoRange()
+    p0.setXRange(-CZAS_OKNA_ANALIZY, 0, padding=0)
+    p0.setYRange(-ylim_signal, ylim_signal, padding=0)
+    p1.setYRange(np.log10(0.5), np.log10(ylim_power), padding=0)
+    win.show()
+    return pg
 
 # --- 2. CALCULATION FUNCTION ---
 def calculate_band_power(signal_chunk):
-    if signal_chunk.shape[0] < SFREQ // 10: return 0.0
-    freqs, psd = welch(signal_chunk, fs=SFREQ, nperseg=min(len(signal_chunk), FFT_WINDOW_SIZE))
-    idx_band = np.logical_and(freqs >= FREQ_MIN, freqs <= FREQ_MAX)
-    if np.sum(idx_band) == 0: return 0.0
-    return np.mean(psd[idx_band])
+    # Single-segment Welch estimate on the last FFT_WINDOW_SIZE samples
+    if signal_chunk.shape[0] < FFT_WINDOW_SIZE or BAND_FREQS.size == 0: return 0.0
+    band = BAND_PROJECTION @ signal_chunk[-FFT_WINDOW_SIZE:]
+    return np.dot(band, band)
 
 # --- 3. MAIN LOOP ---
-start_time = time.time()
+start_time = time.monotonic_ns()
 
-def update_plot(frame):
-    global eeg_buffer, power_buffer, processed_samples, block_until
-    global counter_zacisk, is_calibrated, baseline_power
+def process_frame():
+    global power_buffer, power_write_idx, processed_samples, block_until, zi_all
+    global counter_zacisk, is_calibrated, baseline_power, last_sent_signal
     
-    current_time = time.time()
+    current_time = time.monotonic_ns()
     elapsed = current_time - start_time
     
     try:
         # A. FETCH DATA FROM HARDWARE
         eeg.get_mne()
-        if eeg.data.mne_raw is None: return lines
+        if eeg.data.mne_raw is None: return
         
         all_data = eeg.data.mne_raw.get_data()
         total_samples = all_data.shape[1]
         
         if total_samples > processed_samples:
-            # New data chunk
-            new_chunk = all_data[:, processed_samples:]
+            # New data chunk (cast only the fresh samples, not the whole growing recording)
+            new_chunk = all_data[:, processed_samples:].astype(DTYPE)
             new_len = new_chunk.shape[1]
             
-            # --- 1. RELAY (Sending raw uV to port 6000) ---
-            chunk_uv = new_chunk * 1e6
-            packet = {
-                "data": chunk_uv,        
-                "channels": ALL_CHANNELS_OUT, 
-                "sfreq": SFREQ,
-                "dc_offset": 0 # Sending 0, because the router sends raw data here
-            }
-            try:
-                socket_data.send_pyobj(packet)
-            except zmq.ZMQError:
-                pass 
+            # --- 1. RELAY (Sending raw uV to ZMQ_EP_DATA) ---
+            # Frames this small are copied by pyzmq on send, so the slot is free once sent
+            relay_slot = relay_scratch[len(relay_pending)]
+            n_relay = len(ALL_CHANNELS_OUT) * new_len
+            if n_relay <= relay_slot.size:
+                chunk_uv = relay_slot[:n_relay].reshape(len(ALL_CHANNELS_OUT), new_len)
+                np.multiply(new_chunk[RELAY_CH_IDX], 1e6, out=chunk_uv)
+            else:
+                chunk_uv = np.ascontiguousarray(new_chunk[RELAY_CH_IDX] * 1e6, dtype=np.float32)
+            relay_pending.append(chunk_uv)
+            if len(relay_pending) >= RELAY_BATCH:
+                try:
+                    socket_data.send_multipart([RELAY_HEADER, *relay_pending], flags=zmq.NOBLOCK, copy=False, track=False)
+                except zmq.ZMQError:
+                    pass 
+                relay_pending.clear()
             # --------------------------------------------------
 
             processed_samples = total_samples
             
-            # --- 2. LOCAL BUFFER UPDATE ---
-            # Select only Fp1/Fp2 for Jarvis
-            for i, raw_idx in enumerate(ch_indices):
-                d = new_chunk[raw_idx, :]
-                if new_len >= BUFFER_SIZE: eeg_buffer[i, :] = d[-BUFFER_SIZE:]
-                else:
-                    eeg_buffer[i, :-new_len] = eeg_buffer[i, new_len:]
-                    eeg_buffer[i, -new_len:] = d
+            # --- 2. CHANNEL SELECTION ---
+            # Select only Fp1/Fp2 for Jarvis (one gather; the streaming filter needs no raw history)
+            sel = np.take(new_chunk, CH_IDX, axis=0, mode='clip')
 
             # --- 3. PROCESSING ---
-            raw_avg = np.mean(eeg_buffer, axis=0)
-            
-            filtered_signal = lfilter(b_notch, a_notch, raw_avg)
-            filtered_signal = sosfilt(sos_high, filtered_signal)
+            # Filter only the fresh samples, continuing from the previous frame's filter state.
+            # sos_all/zi_all stay float64: the recursion rides on the electrode DC offset and
+            # loses ~1% of the signal RMS in float32; the output is stored back as float32.
+            n_new = min(new_len, BUFFER_SIZE)
+            raw_avg = np.mean(sel[:, -n_new:], axis=0, out=scratch_avg[:n_new])
+            filtered_new, zi_all = sosfilt(sos_all, raw_avg, zi=zi_all)
+
+            with buffer_lock:
+                if n_new >= BUFFER_SIZE: filtered_buffer[:] = filtered_new
+                else:
+                    filtered_buffer[:-n_new] = filtered_buffer[n_new:]
+                    filtered_buffer[-n_new:] = filtered_new
             
-            if BUFFER_SIZE >= FFT_WINDOW_SIZE:
-                analysis_window = filtered_signal[-FFT_WINDOW_SIZE:]
+            # During the post-detection cooldown the score is discarded, so skip the spectrum
+            in_cooldown = is_calibrated and current_time < block_until
+            if BUFFER_SIZE >= FFT_WINDOW_SIZE and not in_cooldown:
+                analysis_window = filtered_buffer[-FFT_WINDOW_SIZE:]
                 raw_metric_score = calculate_band_power(analysis_window)
             else:
                 raw_metric_score = 0.0
@@ -181,32 +281,29 @@ def update_plot(frame):
             signal_to_send = 0 
 
             if not is_calibrated:
-                status_msg = f"CALIBRATION... {elapsed:.1f}/{CZAS_KALIBRACJI}s"
+                status_msg = f"CALIBRATION... {elapsed / 1e9:.1f}/{CZAS_KALIBRACJI}s"
                 if raw_metric_score > 0:
                     calibration_buffer.append(raw_metric_score)
                 
-                if elapsed > CZAS_KALIBRACJI:
+                if elapsed > CZAS_KALIBRACJI_NS:
                     if len(calibration_buffer) > 5:
                         baseline_power = np.mean(calibration_buffer)
                         if baseline_power == 0: baseline_power = 1.0
                         
                         is_calibrated = True
                         print(f"\n SYSTEM CALIBRATED! Baseline: {baseline_power:.1e}")
-                        
-                        line_thresh_teeth.set_ydata([MNOZNIK_DOLNY_Zeby]) 
-                        line_thresh_head.set_ydata([MNOZNIK_GORNY_Glowa])
                     normalized_score = 1.0 
             else:
                 status_msg = "READY"
                 normalized_score = raw_metric_score / baseline_power if baseline_power > 0 else 0
                 
-                if current_time < block_until:
+                if in_cooldown:
                     status_msg = "COOLDOWN"
                 else:
                     # HEAD (1)
                     if normalized_score > MNOZNIK_GORNY_Glowa:
                         print(f"\n >>> HEAD MOVEMENT! (x{normalized_score:.0f})")
-                        block_until = current_time + COOLDOWN_PO_WYKRYCIU
+                        block_until = current_time + COOLDOWN_PO_WYKRYCIU_NS
                         counter_zacisk = 0 
                         signal_to_send = -1
                         status_msg = "HEAD MOVEMENT!"
@@ -216,17 +313,21 @@ def update_plot(frame):
                         counter_zacisk += 1
                         if counter_zacisk >= MIN_LICZBA_KLATEK:
                             print(f"\n >>> TEETH CLENCH (x{normalized_score:.1f})")
-                            block_until = current_time + COOLDOWN_PO_WYKRYCIU
+                            block_until = current_time + COOLDOWN_PO_WYKRYCIU_NS
                             counter_zacisk = 0
                             signal_to_send = 1
                             status_msg = "TEETH CLENCH!"     
                     else:
                         counter_zacisk = 0 
 
-            # --- 5. BROADCASTING DECISIONS (5556) ---
-            socket_decision.send_json({"move": signal_to_send})
+            # --- 5. BROADCASTING DECISIONS (ZMQ_EP_DECISION) ---
+            # Edge-triggered: every detection, plus the single return to 0 after it
+            # Payload: one signed byte (-1 / 0 / 1)
+            if signal_to_send != 0 or signal_to_send != last_sent_signal:
+                socket_decision.send(struct.pack("b", signal_to_send))
+                last_sent_signal = signal_to_send
 
-            # --- 6. DRAWING ---
+            # --- 6. STATUS + PLOT BUFFER ---
             if is_calibrated:
                 log = f"\r[{status_msg}] Ratio: x{normalized_score:.1f}"
             else:
@@ -234,30 +335,44 @@ def update_plot(frame):
             sys.stdout.write(log.ljust(80))
             sys.stdout.flush()
 
-            if new_len >= BUFFER_SIZE:
-                power_buffer[:] = normalized_score
-            else:
-                power_buffer[:-new_len] = power_buffer[new_len:]
-                power_buffer[-new_len:] = normalized_score
-
-            lines[0].set_ydata(filtered_signal)
-            lines[0].set_xdata(times_buffer)
-            limit0 = max(np.max(np.abs(filtered_signal)), 10.0) * 1.1
-            ax[0].set_ylim(-limit0, limit0)
-            
-            lines[1].set_ydata(power_buffer)
-            lines[1].set_xdata(times_buffer)
-            current_max = np.max(power_buffer)
-            y_max = max(MNOZNIK_GORNY_Glowa * 1.5, current_max * 1.2)
-            ax[1].set_ylim(0.5, y_max) 
+            # Advance the write index instead of shifting; draw() unrolls the ring
+            with buffer_lock:
+                end = power_write_idx + n_new
+                if end <= BUFFER_SIZE: power_buffer[power_write_idx:end] = normalized_score
+                else:
+                    power_buffer[power_write_idx:] = normalized_score
+                    power_buffer[:end - BUFFER_SIZE] = normalized_score
+                power_write_idx = end % BUFFER_SIZE
 
     except Exception as e:
         print(f"\nFATAL ERROR: {e}")
-        return lines
-
-    return lines
 
-def run():
+def acq_loop():
+    # Worker thread: owns the hardware, filtering, detection and ZMQ publishing
+    while not stop_event.is_set():
+        process_frame()
+        stop_event.wait(ANALYSIS_INTERVAL)
+
+def draw():
+    # GUI thread (QTimer): only copies the latest buffers into the curves
+    global plot_frame, ylim_signal, ylim_power
+    with buffer_lock:
+        np.copyto(plot_signal, filtered_buffer)
+        np.take(power_buffer, RING_IDX[power_write_idx:power_write_idx + BUFFER_SIZE], out=plot_power)
+    curves[0].setData(times_buffer, plot_signal)
+    curves[1].setData(times_buffer, plot_power)
+
+    # Rescale y only every YLIM_UPDATE_EVERY frames, and only on a real change
+    plot_frame += 1
+    if plot_frame % YLIM_UPDATE_EVERY == 0:
+        limit0 = max(np.max(np.abs(plot_signal)), 10.0) * 1.1
+        y_max = max(MNOZNIK_GORNY_Glowa * 1.5, np.max(plot_power) * 1.2)
+        if abs(limit0 - ylim_signal) > YLIM_TOLERANCE * ylim_signal or abs(y_max - ylim_power) > YLIM_TOLERANCE * ylim_power:
+            ylim_signal, ylim_power = limit0, y_max
+            plots[0].setYRange(-limit0, limit0, padding=0)
+            plots[1].setYRange(np.log10(0.5), np.log10(y_max), padding=0)
+
+def run(plot=False):
     def setup_acquisition():
         global eeg
         print(f"Connecting to system {DEVICE_NAME}...")
@@ -271,17 +386,38 @@ def run():
             print(f"ERROR: {e}")
             sys.exit(1)
 
+    setup_zmq()
     mgr = setup_acquisition()
+    signal_ready("MOVE") # Relay/decision sockets bound, headband streaming
+    worker = None
     try:
-        ani = FuncAnimation(fig, update_plot, interval=50, blit=False, cache_frame_data=False)
-        plt.show()
+        if plot:
+            # GUI owns the main thread; acquisition/detection runs in the worker
+            pg = init_plot()
+            # A KeyboardInterrupt raised inside a Qt slot is only printed, so Ctrl+C quits the
+            # event loop instead; pg.exec() then returns and the cleanup below runs
+            signal.signal(signal.SIGINT, lambda *_: (print("\nMOVE DETECTOR: Stop."), app.quit()))
+            worker = threading.Thread(target=acq_loop, daemon=True)
+            worker.start()
+            timer = pg.QtCore.QTimer()
+            timer.timeout.connect(draw)
+            timer.start(PLOT_INTERVAL_MS)
+            pg.exec()
+        else:
+            acq_loop()
+    except KeyboardInterrupt:
+        print("\nMOVE DETECTOR: Stop.")
     finally:
         print("Closing...")
+        stop_event.set()
+        if worker is not None: worker.join()
         eeg.stop_acquisition()
         mgr.disconnect()
         eeg.close()
         socket_data.close()
         socket_decision.close()
-        context.term()
 
-run()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move detector (teeth/head) + EEG relay")
+    parser.add_argument("--plot", action="store_true", help="show the live signal/power plot")
+    run(plot=parser.parse_args().plot)
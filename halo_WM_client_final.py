@@ -2,129 +2,181 @@ import numpy as np
 import time
 import sys
 import zmq
-from scipy.signal import butter, sosfilt
+import json
+import struct
+from scipy.signal import butter, sosfilt, sosfilt_zi
+from zmq_common import endpoint, signal_ready
 
 # --- 0. CONFIGURATION ---
 ANALYZED_CHANELS = ['O1', 'O2'] # Channels where we look for blinks
 WINDOW_TIME = 5.0      
 SFREQ = 250
 
+RELAY_EP = endpoint("SIGMA_RELAY_EP", "ipc:///tmp/4sigma_relay.sock", "tcp://127.0.0.1:6000") # Raw EEG from the move detector
+BLINK_EP = endpoint("SIGMA_BLINK_EP", "ipc:///tmp/4sigma_blink.sock", "tcp://*:5555")        # Blink decisions to the Core Unit
+
 # Detection threshold (for derivative in Volts)
 DERIV_THRESH = 20000.0  
+# Minimum time between two reported blinks (one physiological blink must not trigger twice)
+BLINK_REFRACTORY = 0.2
+BLINK_REFRACTORY_NS = int(BLINK_REFRACTORY * 1e9)
+# Status line refresh period (the line is only for the operator, 10 Hz is plenty)
+STATUS_INTERVAL_NS = 100_000_000
 
 # --- GLOBAL VARIABLES ---
-N_CH_INPUT = len(ANALYZED_CHANELS) 
 BUFFER_SIZE = int(SFREQ * WINDOW_TIME)
 
-# Data buffer (Volts)
-eeg_buffer = np.zeros((N_CH_INPUT, BUFFER_SIZE)) 
+# Filtered O1 trace (Volts) - ring buffer stored twice side by side, so the last
+# BUFFER_SIZE samples are always the contiguous view clean_buffer[write_idx:write_idx + BUFFER_SIZE]
+clean_buffer = np.zeros(2 * BUFFER_SIZE, dtype=np.float32) 
+write_idx = 0
 
-# Filters
+# Filters (streamed: the state is carried between packets, only new samples are filtered)
+# Coefficients and state stay float64 (the state carries the electrode DC), samples are float32
 sos_high = butter(2, 0.3, btype='highpass', fs=SFREQ, output='sos')
 sos_low = butter(2, 20.0, btype='lowpass', fs=SFREQ, output='sos')
+sos_blink = np.vstack([sos_high, sos_low]) # Both stages as one cascade -> one sosfilt call per packet
+zi_blink = None # Seeded from the first sample, so the electrode DC offset does not ring
 
 def run_blink_detector():
-    global eeg_buffer
+    global clean_buffer, write_idx, zi_blink
 
     # --- 1. ZMQ CONFIGURATION ---
-    context = zmq.Context()
+    context = zmq.Context.instance(io_threads=1)
 
-    # RECEIVER (Data from Router - port 6000)
+    # RECEIVER (Data from Router - RELAY_EP)
     sub_socket = context.socket(zmq.SUB)
-    sub_socket.connect("tcp://localhost:6000") 
-    sub_socket.setsockopt_string(zmq.SUBSCRIBE, "") 
+    sub_socket.setsockopt(zmq.RCVBUF, 1 << 20) # Mirror the relay's 1 MB kernel buffer
+    sub_socket.setsockopt(zmq.RCVHWM, 10)
     # No CONFLATE, because we need continuity for filters!
 
-    # TRANSMITTER (Decisions to Core Unit - port 5555)
+    # TRANSMITTER (Decisions to Core Unit - BLINK_EP)
     pub_socket = context.socket(zmq.PUB)
-    pub_socket.bind("tcp://*:5555")
+    pub_socket.setsockopt(zmq.SNDHWM, 100)
+
+    # Common options, still before connect/bind
+    for sock in (sub_socket, pub_socket):
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+
+    sub_socket.connect(RELAY_EP)
+    sub_socket.setsockopt_string(zmq.SUBSCRIBE, "") 
+    pub_socket.bind(BLINK_EP)
+    signal_ready("BLINK")
+
+    layouts = {} # Relay header -> (number of channels, indices of ANALYZED_CHANELS)
+    last_sent_status = 0
+    last_blink_ns = -BLINK_REFRACTORY_NS
+    last_status_ns = 0
+
+    # Sleep in the kernel until relay data arrives (timeout keeps Ctrl+C responsive)
+    poller = zmq.Poller()
+    poller.register(sub_socket, zmq.POLLIN)
 
-    print(">>> BLINKER MODULE: Start. Listening on 6000, transmitting on 5555")
+    print(f">>> BLINKER MODULE: Start. Listening on {RELAY_EP}, transmitting on {BLINK_EP}")
 
     try:
         while True:
             # --- 2. DATA RECEPTION ---
+            if not poller.poll(50):
+                continue
+
             try:
                 packets = []
                 # Retrieve everything waiting in the queue (empty the network buffer)
                 while True:
-                    packet = sub_socket.recv_pyobj(flags=zmq.NOBLOCK)
+                    packet = sub_socket.recv_multipart(flags=zmq.NOBLOCK)
                     packets.append(packet)
                     # Safety limit
                     if len(packets) > 10: break 
             except zmq.Again:
                 pass # No more data at the moment
 
-            # If there is no new data, short nap and next iteration
             if not packets:
-                time.sleep(0.01)
                 continue
 
             # --- 3. PACKET PROCESSING ---
             chunks_to_process = []
             
-            for pkt in packets:
-                full_data_uv = pkt["data"]      # Data in uV
-                offset = pkt["dc_offset"]       # Offset
-                channel_names = pkt["channels"]
-                
-                # Conversion to Volts (V) - according to your threshold 20000.0 for V/s
-                # (If you prefer uV, remove /1e6 and adjust the threshold)
-                full_data_v = full_data_uv / 1e6
-                offset_v = offset / 1e6
-                
-                # Remove offset locally
-                clean_v = full_data_v - offset_v
-                
-                # Select channels
-                indices = [channel_names.index(ch) for ch in ANALYZED_CHANELS]
-                my_chunk = clean_v[indices, :]
-                chunks_to_process.append(my_chunk)
+            for header, *payloads in packets:
+                # Header (channel layout) is constant per sender - parse it only once
+                layout = layouts.get(header)
+                if layout is None:
+                    channel_names = json.loads(header)["channels"]
+                    indices = [channel_names.index(ch) for ch in ANALYZED_CHANELS]
+                    layout = layouts[header] = (len(channel_names), indices)
+                n_channels, indices = layout
+
+                # One message may carry several consecutive chunks (relay batching)
+                for payload in payloads:
+                    full_data_uv = np.frombuffer(payload, dtype=np.float32).reshape(n_channels, -1) # Data in uV
+                    
+                    # Conversion to Volts (V) - according to your threshold 20000.0 for V/s
+                    # (If you prefer uV, remove /1e6 and adjust the threshold)
+                    # Select channels
+                    my_chunk = full_data_uv[indices, :] / np.float32(1e6) # Stays float32
+                    chunks_to_process.append(my_chunk)
 
             # Concatenate new data
             new_block = np.concatenate(chunks_to_process, axis=1)
             chunk_len = new_block.shape[1]
-
-            # Buffer update (rolling)
-            eeg_buffer = np.roll(eeg_buffer, -chunk_len, axis=1)
-            eeg_buffer[:, -chunk_len:] = new_block
+            if chunk_len == 0:
+                continue # Only empty chunks arrived - nothing new to filter or check
 
             # --- 4. SIGNAL ANALYSIS ---
             
-            # Subtract local DC (window mean)
-            dc_offset_local = np.mean(eeg_buffer, axis=1, keepdims=True)
-            data_centered = eeg_buffer - dc_offset_local
-            
-            # Filtering
-            clean_o1 = sosfilt(sos_low, sosfilt(sos_high, data_centered[0]))
-            
-            # Derivative calculation (rate of change)
-            deriv_trace_o1 = np.diff(clean_o1, prepend=clean_o1[0]) * SFREQ
+            # Filtering - only the new samples, continuing from the previous packet's state
+            # (the highpass removes the DC, so no window-mean subtraction is needed)
+            raw_o1 = new_block[0]
+            if zi_blink is None: zi_blink = sosfilt_zi(sos_blink) * raw_o1[0]
+            clean_new, zi_blink = sosfilt(sos_blink, raw_o1, zi=zi_blink)
+
+            # Buffer update (ring): write each sample into both halves, no shifting
+            n_new = min(chunk_len, BUFFER_SIZE)
+            clean_new = clean_new[-n_new:]
+            first = min(n_new, BUFFER_SIZE - write_idx)
+            clean_buffer[write_idx:write_idx + first] = clean_new[:first]
+            clean_buffer[write_idx + BUFFER_SIZE:write_idx + BUFFER_SIZE + first] = clean_new[:first]
+            rest = n_new - first
+            if rest:
+                clean_buffer[:rest] = clean_new[first:]
+                clean_buffer[BUFFER_SIZE:BUFFER_SIZE + rest] = clean_new[first:]
+            write_idx = (write_idx + n_new) % BUFFER_SIZE
+            clean_o1 = clean_buffer[write_idx:write_idx + BUFFER_SIZE] # Oldest -> newest
             
             # Detection only on the NEW fragment (to avoid detecting the same blink repeatedly)
             # Checking e.g. the last 0.1s or the length of the new batch
-            check_len = max(chunk_len, int(SFREQ * 0.1))
-            last_deriv_segment = deriv_trace_o1[-check_len:]
+            check_len = min(max(chunk_len, int(SFREQ * 0.1)), BUFFER_SIZE - 1)
             
-            max_deriv = np.max(np.abs(last_deriv_segment))
+            # Derivative calculation (rate of change) over that fragment only;
+            # abs/max run in place on the diff, the SFREQ scale is applied to the scalar
+            last_deriv_segment = np.diff(clean_o1[-check_len - 1:])
+            max_deriv = np.abs(last_deriv_segment, out=last_deriv_segment).max() * SFREQ
             
             status_do_wyslania = 0
 
             # --- 5. DECISION LOGIC ---
             if max_deriv > DERIV_THRESH:
-                print(f">>> BLINK DETECTED! (d/dt: {max_deriv:.2f})")
                 status_do_wyslania = 1
             
-            # Logging in one line (overwriting)
-            sys.stdout.write(f"\rMax d/dt: {max_deriv:.2f} | Status: {status_do_wyslania}   ")
-            sys.stdout.flush()
+            # Logging in one line (overwriting), rate-limited to save a write+flush per packet
+            now = time.monotonic_ns()
+            if now - last_status_ns >= STATUS_INTERVAL_NS:
+                sys.stdout.write(f"\rMax d/dt: {max_deriv:.2f} | Status: {status_do_wyslania}   ")
+                sys.stdout.flush()
+                last_status_ns = now
 
             # --- 6. SENDING RESULT TO CORE UNIT ---
-            # Sending {"blink": 1} or {"blink": 0}
-            pub_socket.send_json({"blink": status_do_wyslania})
-
-            # Short sleep to unload CPU (while True loop without GUI is very fast)
-            time.sleep(0.01)
+            # Edge-triggered: only changes are sent, as one signed byte: 1 (blink) or 0
+            # A rising edge inside the refractory period of the last blink is dropped: it is marked
+            # as sent without sending, so a 1 that lasts past the period cannot fire a second blink
+            if status_do_wyslania != last_sent_status:
+                if status_do_wyslania == 0 or now - last_blink_ns >= BLINK_REFRACTORY_NS:
+                    if status_do_wyslania == 1:
+                        print(f"\n>>> BLINK DETECTED! (d/dt: {max_deriv:.2f})")
+                        last_blink_ns = now
+                    pub_socket.send(struct.pack("b", status_do_wyslania))
+                last_sent_status = status_do_wyslania
 
     except KeyboardInterrupt:
         print("\nBLINKER: Stop.")
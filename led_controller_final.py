@@ -1,12 +1,18 @@
 import sys
 import zmq
+import struct
 import threading
 import tkinter as tk
 from enum import Enum
 import signal
+import socket
+from zmq_common import endpoint
 
 # --- ZMQ Configuration ---
-ZMQ_HOST = "tcp://localhost:5557"
+ZMQ_HOST = endpoint("SIGMA_LED_EP", "ipc:///tmp/4sigma_led.sock", "tcp://127.0.0.1:5557") # LED flags from the Core Unit
+ZMQ_CTRL = "inproc://led-listener-ctrl" # Wakes the listener thread for shutdown
+DEBUG = False # Print every LED change (the core unit already logs its state transitions)
+KILL_POLL_MS = 50 # Ctrl+C check period where Tk cannot watch the signal wakeup socket (Windows)
 
 # --- Color Definition ---
 class LedColor(Enum):
@@ -14,6 +20,14 @@ class LedColor(Enum):
     ORANGE = "#FFA500"   # Orange (Wait / Detected)
     GREEN = "#00FF00"    # Green (Ready)
 
+# Core Unit flag -> (color, debug text), resolved once instead of per message
+FLAG_STYLES = {
+    0: (LedColor.ORANGE.value, "CALM DOWN (Orange)"), # BLI
+    1: (LedColor.GREEN.value, "READY (Green)"),       # RDY
+    2: (LedColor.RED.value, "LISTENING (Red)"),       # RST
+}
+UNKNOWN_STYLE = (LedColor.RED.value, "UNKNOWN")
+
 # --- Window Settings ---
 TRANSPARENT_BG = '#010101' 
 
@@ -62,29 +76,33 @@ class LedOverlay:
             outline="" 
         )
 
-    def update_state(self, flag):
-        color = LedColor.RED.value
-        debug_text = "UNKNOWN"
-
-        if flag == 0:   # BLI
-            color = LedColor.ORANGE.value
-            debug_text = "CALM DOWN (Orange)"
-        elif flag == 1: # RDY
-            color = LedColor.GREEN.value
-            debug_text = "READY (Green)"
-        elif flag == 2: # RST
-            color = LedColor.RED.value
-            debug_text = "LISTENING (Red)"
+    def post_state(self, flag):
+        # Safe from any thread: the canvas change runs on the Tk main loop
+        self.root.after_idle(self.update_state, flag)
 
+    def update_state(self, flag):
+        color, debug_text = FLAG_STYLES.get(flag, UNKNOWN_STYLE)
         self.canvas.itemconfig(self.led_circle, fill=color)
-        print(f"--- LED: {debug_text} ---")
+        if DEBUG: print(f"--- LED: {debug_text} ---")
 
     def watch_for_kill_signal(self):
         """
-        This is a key function. It wakes up the GUI every 500ms so Python can
-        process the Ctrl+C signal (KeyboardInterrupt).
+        This is a key function. Python only handles Ctrl+C (KeyboardInterrupt) when
+        the Tk mainloop wakes up. On POSIX the signal writes to a wakeup socket that
+        Tk watches, so it wakes immediately; elsewhere the GUI polls every KILL_POLL_MS.
         """
-        self.root.after(500, self.watch_for_kill_signal)
+        if hasattr(self.root.tk, "createfilehandler"):
+            self.wakeup_r, self.wakeup_w = socket.socketpair()
+            self.wakeup_r.setblocking(False)
+            self.wakeup_w.setblocking(False)
+            signal.set_wakeup_fd(self.wakeup_w.fileno())
+            # Just drain the byte; mainloop checks pending signals after every event
+            self.root.tk.createfilehandler(self.wakeup_r, tk.READABLE, lambda *_: self.wakeup_r.recv(64))
+        else:
+            self.poll_kill_signal()
+
+    def poll_kill_signal(self):
+        self.root.after(KILL_POLL_MS, self.poll_kill_signal)
 
     def start(self):
         # Start the "watchdog"
@@ -96,35 +114,69 @@ class LedOverlay:
         self.root.destroy()
 
 class ZmqListener(threading.Thread):
-    def __init__(self, gui_controller):
+    def __init__(self, gui_controller, subscriptions=()):
         super().__init__()
         self.gui = gui_controller
+        # Extra (endpoint, callback(payload)) links served by this same poll loop
+        self.subscriptions = subscriptions
         self.daemon = True 
         self.running = True
+        self.last_flag = None # Last flag handed to the GUI, repeats are skipped
         self.context = None
         self.socket = None
+        self.ctrl = None
+        self.extra_sockets = []
+
+    def subscribe(self, endpoint):
+        sock = self.context.socket(zmq.SUB)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.setsockopt(zmq.TCP_KEEPALIVE, 1)
+        # Only the newest message matters: keep one, drop the stale ones
+        sock.setsockopt(zmq.CONFLATE, 1)
+        sock.setsockopt(zmq.RCVHWM, 1)
+        print(f"Connecting to ZMQ on: {endpoint}...")
+        sock.connect(endpoint)
+        sock.setsockopt_string(zmq.SUBSCRIBE, "")
+        return sock
 
     def run(self):
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
-        
-        # Receive timeout (1000ms), so the thread doesn't hang indefinitely
-        self.socket.setsockopt(zmq.RCVTIMEO, 1000)
+        self.context = zmq.Context.instance(io_threads=1)
+
+        # The thread sleeps in poll() until a message or the shutdown message from stop() arrives
+        self.ctrl = self.context.socket(zmq.PAIR)
+        self.ctrl.setsockopt(zmq.LINGER, 0)
+        self.ctrl.bind(ZMQ_CTRL)
+        poller = zmq.Poller()
+        poller.register(self.ctrl, zmq.POLLIN)
         
         try:
-            print(f"Connecting to ZMQ on: {ZMQ_HOST}...")
-            self.socket.connect(ZMQ_HOST)
-            self.socket.setsockopt_string(zmq.SUBSCRIBE, "") 
+            self.socket = self.subscribe(ZMQ_HOST)
+            poller.register(self.socket, zmq.POLLIN)
+            for endpoint, callback in self.subscriptions:
+                sock = self.subscribe(endpoint)
+                self.extra_sockets.append((sock, callback))
+                poller.register(sock, zmq.POLLIN)
             
             while self.running:
                 try:
-                    msg = self.socket.recv_json()
-                    flag = msg.get("flag")
-                    if flag is not None:
-                        self.gui.update_state(flag)
-                except zmq.Again:
-                    # No message in this cycle, check running flag and loop again
-                    continue
+                    socks = dict(poller.poll())
+                    if self.ctrl in socks:
+                        break
+                    if self.socket in socks:
+                        # Flag arrives as one signed byte (0 / 1 / 2)
+                        flag = struct.unpack("b", self.socket.recv())[0]
+                        # Tkinter is not thread-safe: the redraw is posted to the Tk main loop
+                        if flag != self.last_flag:
+                            self.gui.post_state(flag)
+                            self.last_flag = flag
+                    for sock, callback in self.extra_sockets:
+                        if sock in socks:
+                            payload = sock.recv()
+                            # A failing consumer must not stop the thread (and with it the LED)
+                            try:
+                                callback(payload)
+                            except Exception as e:
+                                print(f"Subscriber callback error ({e}), continuing.")
                 except zmq.ContextTerminated:
                     break
                     
@@ -132,20 +184,32 @@ class ZmqListener(threading.Thread):
             print(f"ZMQ Error: {e}")
         finally:
             if self.socket: self.socket.close()
-            if self.context: self.context.term()
+            if self.ctrl: self.ctrl.close()
+            for sock, _ in self.extra_sockets: sock.close()
+
+    def stop(self):
+        # Called from the main thread: wake the poller so the thread exits right away
+        self.running = False
+        sender = zmq.Context.instance().socket(zmq.PAIR)
+        sender.setsockopt(zmq.LINGER, 0) # inproc delivers on send; never hold shutdown if the thread is gone
+        sender.connect(ZMQ_CTRL)
+        sender.send(b"")
+        sender.close()
 
-def run():
+def run(subscriptions=()):
+    # subscriptions: extra (endpoint, callback) links to serve from the listener thread,
+    # so other consumers can share this process (see the loader's UI process)
     print("--- LED CONTROLLER (TRANSPARENT MODE) ---")
     print("Press Ctrl+C in terminal to exit.")
     
     gui = LedOverlay()
-    listener = ZmqListener(gui)
+    listener = ZmqListener(gui, subscriptions)
     listener.start()
     
     try:
         gui.start()
     except KeyboardInterrupt:
         print("\nStopping LED interface...")
-        listener.running = False
+        listener.stop()
         gui.stop()
         sys.exit(0)
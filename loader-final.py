@@ -1,13 +1,30 @@
 import multiprocessing as mp
+from multiprocessing.connection import wait
+import importlib
 import time
 import sys
+import os
+import zmq
+from zmq_common import endpoint
 
 # Importing your modules
 import halo_WM_client_final as bd
-import led_controller as lc
+import led_controller_final as lc
 # import fourier_final as md
-import player2 as pc
-import core_unit as cu
+pc = importlib.import_module("player-final") # File name is not a valid identifier
+import core_unit_final as cu
+
+# Readiness handshake: each child pushes its name here once its sockets are bound
+READY_EP = endpoint("SIGMA_READY_EP", "ipc:///tmp/4sigma_ready.sock", "tcp://127.0.0.1:5559")
+READY_TIMEOUT = 15.0 # Max wait per module (the move detector includes the headband connection)
+SHUTDOWN_TIMEOUT = 1.0 # Total time all modules get to exit after terminate() before they are killed
+
+# CPU pinning per module (Linux only, None = leave it to the scheduler)
+# Only worth setting on many-core machines, where the scheduler migrates these small processes
+# between cores/NUMA nodes; each ZMQ context already runs a single IO thread.
+# Threads started later (ZMQ IO, Tk listener) inherit the core.
+# The move detector pins itself (DSP_CPU / ZMQ_IO_CPU in fourier_final), so it has no entry here.
+PROCESS_CPUS = {"CORE": None, "BLINK": None, "UI": None}
 
 def run_module(target_func, name):
     """
@@ -15,82 +32,134 @@ def run_module(target_func, name):
     """
     try:
         print(f"[{name}] Starting...")
+        cpu = PROCESS_CPUS.get(name)
+        if cpu is not None and hasattr(os, "sched_getaffinity") and cpu in os.sched_getaffinity(0):
+            os.sched_setaffinity(0, {cpu})
         target_func()
     except KeyboardInterrupt:
         print(f"[{name}] Stopped (Ctrl+C).")
     except Exception as e:
         print(f"[{name}] CRITICAL ERROR: {e}")
 
+def wait_ready(pull, process, name):
+    """
+    Blocks until the child reports ready, dies, or READY_TIMEOUT passes.
+    """
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline and process.is_alive():
+        if pull.poll(100):
+            print(f"[{name}] Ready ({pull.recv_string()}).")
+            return True
+    print(f"!!! [{name}] did not report ready, continuing anyway.")
+    return False
+
+def run_ui():
+    """
+    LED overlay and slide controller in one process: the Tk window owns the main
+    thread and a single ZMQ poller thread serves both the LED flags and the slide commands.
+    """
+    print("[UI] Focus the presentation window before the activation blink.")
+    lc.run(subscriptions=[(pc.ZMQ_HOST, pc.handle_slide_command)])
+
 if __name__ == '__main__':
+    # On Linux the children are forked from this already-initialized loader, so numpy/scipy/zmq/
+    # tkinter imported above are shared instead of re-imported per process (Python 3.14 would
+    # otherwise default to forkserver). macOS/Windows keep spawn: fork is unsafe with their GUI stacks.
+    if sys.platform.startswith("linux"):
+        try:
+            mp.set_start_method("fork")
+        except RuntimeError:
+            pass # Start method already chosen
+
     # Using multiprocessing to avoid conflict between 
     # Qt GUI (in move_detect) and Tkinter GUI (in led_controller).
     # Each module gets its own independent system process.
 
     processes = []
 
+    # Children inherit the endpoint through the environment (works for fork and spawn)
+    os.environ["SIGMA_READY_EP"] = READY_EP
+    # This context exists before the children are forked. That is safe: pyzmq (>= 18.1) gives a
+    # forked child a fresh Context.instance() instead of the parent's, whose IO thread it lacks
+    ready_pull = zmq.Context.instance().socket(zmq.PULL)
+    ready_pull.setsockopt(zmq.LINGER, 0)
+    ready_pull.bind(READY_EP)
+
     # Process definition (Target points to the main function in each file)
     
     # 1. CORE UNIT - System brain (must wake up so others have somewhere to connect)
-    p_core = mp.Process(target=run_module, args=(cu.core_unit, "CORE"))
+    p_core = mp.Process(target=run_module, args=(cu.run_core_unit, "CORE"), name="CORE")
     processes.append(p_core)
 
     # 2. MOVE DETECT (MASTER) - Handles hardware and sends data (Relay)
     # This process is the most important because it holds the connection to the band.
-    # p_move = mp.Process(target=run_module, args=(md.run, "MOVE_MASTER"))
+    # p_move = mp.Process(target=run_module, args=(md.run, "MOVE_MASTER"), name="MOVE_MASTER")
     # processes.append(p_move)
 
     # 3. BLINK DETECT - Client analyzing blinks
-    p_blink = mp.Process(target=run_module, args=(bd.run_blink_detector, "BLINK"))
+    p_blink = mp.Process(target=run_module, args=(bd.run_blink_detector, "BLINK"), name="BLINK")
     processes.append(p_blink)
 
-    # 4. PRES CTRL - Slide controller (Executor)
-    p_pres = mp.Process(target=run_module, args=(pc.run_slide_controller, "PRES_CTRL"))
-    processes.append(p_pres)
-
-    # 5. LED CONTROLLER - Visual overlay (GUI)
-    p_led = mp.Process(target=run_module, args=(lc.run, "LED_GUI"))
-    processes.append(p_led)
+    # 4. UI - LED overlay (GUI) + slide controller (Executor), sharing one process
+    p_ui = mp.Process(target=run_module, args=(run_ui, "UI"), name="UI")
+    processes.append(p_ui)
 
     print(">>> SYSTEM START: Jarvis Initialization...")
 
     # --- STARTUP SEQUENCE ---
     
+    # Each step waits for the module's readiness message instead of a fixed sleep
     # Step 1: Central logic
     p_core.start()
-    time.sleep(0.5) 
+    wait_ready(ready_pull, p_core, "CORE")
 
     # Step 2: Hardware and plots (This will take a moment as it connects to the band)
     # p_move.start()
-    # Giving it 2 seconds to establish connection and set up the ZMQ router
-    time.sleep(2.5) 
+    # wait_ready(ready_pull, p_move, "MOVE_MASTER")
 
     # Step 3: The rest of analytical and executive modules
     p_blink.start()
-    p_pres.start()
-    time.sleep(0.5)
+    wait_ready(ready_pull, p_blink, "BLINK")
 
-    # Step 4: User interface (on top)
-    p_led.start()
+    # Step 4: User interface (on top) and slide control
+    p_ui.start()
 
     print("\n>>> ALL SYSTEMS OPERATIONAL.")
     print(">>> Press Ctrl+C in this console to shut down everything.\n")
 
+    # If one of these dies, we close everything
+    critical = [p_core] # + [p_move] with the hardware process enabled
+
     try:
-        # Main loader loop - monitors process state
-        while True:
-            time.sleep(1)
-            # If the main hardware process dies, we close everything
-            # if not p_move.is_alive():
-            #     print("!!! ERROR: Master Process (Move/Hardware) has been closed!")
-            #     raise KeyboardInterrupt
+        # Main loader loop - sleeps until a child process exits (no periodic polling)
+        running = list(processes)
+        while running:
+            ended = wait([p.sentinel for p in running])
+            for p in [p for p in running if p.sentinel in ended]:
+                running.remove(p)
+                p.join() # Already gone, reaps it so exitcode is set
+                print(f"!!! Process {p.name} has exited (code {p.exitcode}).")
+                if p in critical:
+                    print("!!! ERROR: Critical process has been closed!")
+                    raise KeyboardInterrupt
             
     except KeyboardInterrupt:
         print("\n\n>>> SHUTTING DOWN SYSTEM...")
-        # Sending shutdown signal to all processes
-        for p in processes:
+        # Signal every process first, then wait for all of them against one shared deadline
+        started = [p for p in processes if p.pid is not None]
+        for p in started:
             if p.is_alive():
                 p.terminate()
-                p.join() # Waiting for the process to clean up after itself
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for p in started:
+            p.join(max(0, deadline - time.monotonic()))
+        # Stragglers are killed (SIGKILL / TerminateProcess)
+        for p in started:
+            if p.is_alive():
+                print(f"!!! Process {p.name} did not exit, killing it.")
+                p.kill()
+                p.join()
         
+        ready_pull.close()
         print(">>> Goodbye.")
         sys.exit(0)
@@ -1,20 +1,120 @@
+import os
 import sys
 import time
 import zmq
-import pyautogui
-
-# Safety fail-safe: moving mouse to a corner aborts the script
-pyautogui.FAILSAFE = True
+import struct
+from zmq_common import endpoint
 
 # ZMQ Configuration
-ZMQ_HOST = "tcp://localhost:5558"
+ZMQ_HOST = endpoint("SIGMA_SLIDE_EP", "ipc:///tmp/4sigma_slide.sock", "tcp://127.0.0.1:5558") # Slide commands from the Core Unit
+
+# Key presses go straight to the OS (keybd_event on Windows, XTest on X11): no 0.1 s
+# pyautogui pause per press and no screenshot stack in this process.
+# pyautogui is only imported as a fallback (e.g. macOS / no X display).
+VK_CODES = {"right": 0x27, "left": 0x25} # Windows virtual-key codes
+KEYEVENTF_EXTENDEDKEY = 0x0001 # Arrows are extended keys (not the numpad ones)
+KEYEVENTF_KEYUP = 0x0002
+SM_CXSCREEN, SM_CYSCREEN = 0, 1 # GetSystemMetrics indices of the primary screen size
+key_sender = None # Created on the first press, in the thread that sends the keys
+
+# Safety fail-safe (same as pyautogui.FAILSAFE): with the mouse in a screen corner key presses
+# raise FailSafeTriggered, which stops the standalone controller
+FAILSAFE = True
+
+class FailSafeTriggered(Exception):
+    pass
+
+def check_failsafe(x, y, width, height):
+    if FAILSAFE and x in (0, width - 1) and y in (0, height - 1):
+        raise FailSafeTriggered("mouse moved to a screen corner")
+
+# Repeats of the same command closer than this are treated as chatter, not a new slide change
+SLIDE_DEBOUNCE = 0.15
+SLIDE_DEBOUNCE_NS = int(SLIDE_DEBOUNCE * 1e9)
+last_move = None
+last_move_ns = 0
+
+def init_key_sender():
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        cursor = wintypes.POINT()
+        def press(key):
+            user32.GetCursorPos(ctypes.byref(cursor))
+            check_failsafe(cursor.x, cursor.y, user32.GetSystemMetrics(SM_CXSCREEN), user32.GetSystemMetrics(SM_CYSCREEN))
+            vk = VK_CODES[key]
+            user32.keybd_event(vk, 0, KEYEVENTF_EXTENDEDKEY, 0)
+            user32.keybd_event(vk, 0, KEYEVENTF_EXTENDEDKEY | KEYEVENTF_KEYUP, 0)
+        return press
+
+    try:
+        # python-xlib is already installed with pyautogui on Linux
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        disp = display.Display()
+        screen = disp.screen()
+        keycodes = {key: disp.keysym_to_keycode(XK.string_to_keysym(key.capitalize())) for key in VK_CODES}
+        def press(key):
+            pointer = screen.root.query_pointer()
+            check_failsafe(pointer.root_x, pointer.root_y, screen.width_in_pixels, screen.height_in_pixels)
+            xtest.fake_input(disp, X.KeyPress, keycodes[key])
+            xtest.fake_input(disp, X.KeyRelease, keycodes[key])
+            disp.sync()
+        return press
+    except Exception as e:
+        print(f"Direct key input unavailable ({e}), using pyautogui.")
+
+    import pyautogui
+    pyautogui.FAILSAFE = FAILSAFE
+    pyautogui.PAUSE = 0 # No sleep after every press
+    def press(key):
+        try:
+            pyautogui.press(key)
+        except pyautogui.FailSafeException as e:
+            raise FailSafeTriggered(str(e))
+    return press
+
+def press_key(key):
+    global key_sender
+    if key_sender is None:
+        key_sender = init_key_sender()
+    key_sender(key)
+
+def handle_slide_command(payload):
+    """
+    Turns one slide command from the Core Unit into a key press.
+    """
+    global last_move, last_move_ns
+    # Move arrives as one signed byte (-1 / 1)
+    move_signal = struct.unpack("b", payload)[0]
+
+    # Debounce: skip an identical command inside SLIDE_DEBOUNCE of the previous one
+    now = time.monotonic_ns()
+    if move_signal == last_move and now - last_move_ns < SLIDE_DEBOUNCE_NS:
+        return
+    last_move = move_signal
+    last_move_ns = now
+
+    if move_signal == 1:
+        print(f"[RECEIVED] Signal: {move_signal} -> NEXT SLIDE")
+        press_key('right')
+
+    elif move_signal == -1:
+        print(f"[RECEIVED] Signal: {move_signal} -> PREVIOUS SLIDE")
+        press_key('left')
 
 def run_slide_controller():
     """
     Listens for commands from the Core Unit via ZMQ and controls presentation slides.
     """
-    context = zmq.Context()
+    context = zmq.Context.instance(io_threads=1)
     socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.setsockopt(zmq.TCP_KEEPALIVE, 1)
+    # Only the newest command matters; a stale queued slide change is dropped
+    socket.setsockopt(zmq.CONFLATE, 1)
+    socket.setsockopt(zmq.RCVHWM, 1)
 
     # Set receive timeout to 1000ms (1s).
     # This ensures the loop cycles periodically to check for KeyboardInterrupt (Ctrl+C).
@@ -52,31 +152,25 @@ def run_slide_controller():
         try:
             # Attempt to receive message with timeout
             try:
-                msg = socket.recv_json()
+                payload = socket.recv()
             except zmq.Again:
                 # No message received within timeout (1s); loop to check for interrupts
                 continue
 
-            move_signal = msg.get("move", 0)
-
-            if move_signal == 1:
-                print(f"[RECEIVED] Signal: {move_signal} -> NEXT SLIDE")
-                pyautogui.press('right')
-
-            elif move_signal == -1:
-                print(f"[RECEIVED] Signal: {move_signal} -> PREVIOUS SLIDE")
-                pyautogui.press('left')
+            handle_slide_command(payload)
 
         except KeyboardInterrupt:
             print("\nStopping controller...")
             break
+        except FailSafeTriggered as e:
+            print(f"\nFail-safe triggered ({e}), stopping controller...")
+            break
         except Exception as e:
+            # One failed command (e.g. lost display connection) must not stop the controller
             print(f"Error: {e}")
-            break
 
     # Resource cleanup
     socket.close()
-    context.term()
     sys.exit(0)
 
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+import os
+import zmq
+
+# --- ZMQ helpers shared by the modules ---
+# Socket options must be set before connect/bind: libzmq copies them into each connection then,
+# later changes do not reach existing connections (CONFLATE, HWM, keepalive...).
+
+def endpoint(env_var, ipc_endpoint, tcp_endpoint):
+    # UNIX socket on POSIX, TCP on Windows (no ipc:// transport there); any link can be
+    # overridden with its SIGMA_*_EP environment variable (same value for every module)
+    return os.environ.get(env_var, ipc_endpoint if os.name != "nt" else tcp_endpoint)
+
+def signal_ready(name):
+    # Started by the loader: tell it our endpoints are bound (no-op when run standalone)
+    ready_ep = os.environ.get("SIGMA_READY_EP")
+    if not ready_ep: return
+    push = zmq.Context.instance().socket(zmq.PUSH)
+    push.setsockopt(zmq.LINGER, 1000)
+    push.connect(ready_ep)
+    push.send_string(name)
+    push.close()